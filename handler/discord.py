@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import Dict, List
+import httpx
+import orjson
+
+logger = logging.getLogger(__name__)
+
+DISCORD_MESSAGE_LIMIT = 2000
+DISCORD_BATCH_SIZE = 10
+DISCORD_BATCH_WINDOW = 0.5  # seconds to let a burst accumulate before posting
+
+
+async def send_to_discord(client: httpx.AsyncClient, webhook_url: str, content: str):
+    """
+    Sends a simple message to Discord webhook.
+    
+    Args:
+        client (httpx.AsyncClient): Shared Discord client from app state
+        webhook_url (str): Discord webhook URL
+        content (str): Message content (up to 2000 characters)
+    """
+    if not webhook_url:
+        logger.warning("Discord webhook URL not configured")
+        return
+    
+    try:
+        # Ensure content doesn't exceed Discord's 2000 character limit
+        if len(content) > 2000:
+            content = content[:1997] + "..."
+        
+        payload = orjson.dumps({"content": content})
+        
+        response = await client.post(
+            webhook_url,
+            content=payload,
+            headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+        logger.debug("Successfully sent message to Discord")
+            
+    except Exception as e:
+        logger.error("Failed to send Discord webhook: %s", e)
+
+
+def enqueue_discord_message(queue: asyncio.Queue, webhook_url: str, content: str):
+    """
+    Hands a message to the Discord consumer without waiting on the webhook.
+    Messages are dropped when the queue is full so a Discord outage cannot
+    pile up unbounded work.
+    
+    Args:
+        queue (asyncio.Queue): Discord queue from app state
+        webhook_url (str): Discord webhook URL
+        content (str): Message content
+    """
+    try:
+        queue.put_nowait((webhook_url, content))
+    except asyncio.QueueFull:
+        logger.warning("Discord queue is full, dropping message")
+
+
+def pack_discord_messages(contents: List[str]) -> List[str]:
+    """
+    Joins queued messages into as few posts as fit Discord's character limit.
+    
+    Args:
+        contents (List[str]): Messages queued for the same webhook
+    """
+    posts = []
+    current: List[str] = []
+    length = 0
+    for content in contents:
+        if len(content) > DISCORD_MESSAGE_LIMIT:
+            content = content[:DISCORD_MESSAGE_LIMIT - 3] + "..."
+        if current and length + 1 + len(content) > DISCORD_MESSAGE_LIMIT:
+            posts.append("\n".join(current))
+            current = []
+            length = 0
+        # Every message after the first costs one extra newline separator
+        length += len(content) + (1 if current else 0)
+        current.append(content)
+    if current:
+        posts.append("\n".join(current))
+    return posts
+
+
+async def discord_consumer(client: httpx.AsyncClient, queue: asyncio.Queue):
+    """
+    Long-running task that drains the Discord queue, coalescing bursts of
+    messages into a single post per webhook.
+    
+    Args:
+        client (httpx.AsyncClient): Shared Discord client from app state
+        queue (asyncio.Queue): Discord queue from app state
+    """
+    while True:
+        batch = [await queue.get()]
+        await asyncio.sleep(DISCORD_BATCH_WINDOW)
+        try:
+            while len(batch) < DISCORD_BATCH_SIZE:
+                batch.append(queue.get_nowait())
+        except asyncio.QueueEmpty:
+            pass
+
+        try:
+            by_webhook: Dict[str, List[str]] = {}
+            for webhook_url, content in batch:
+                by_webhook.setdefault(webhook_url, []).append(content)
+            for webhook_url, contents in by_webhook.items():
+                for post in pack_discord_messages(contents):
+                    await send_to_discord(client, webhook_url, post)
+        finally:
+            for _ in batch:
+                queue.task_done()
@@ -1,10 +1,18 @@
 import os
-import json
+import orjson
 import re
+import logging
 from typing import List, Dict, Any
 from dotenv import load_dotenv
 import google.generativeai as genai
 
+logger = logging.getLogger(__name__)
+
+JSON_FENCE_RE = re.compile(r"```json\n?|\n```")
+JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+INVALID_ESCAPE_RE = re.compile(r'\\(?!["\\/bfnrtu])')
+TRAILING_COMMA_RE = re.compile(r',\s*([\}\]])')
+
 class GeneratorAgent:
     """
     Generates a final, structured JSON answer based on the retrieved document chunks.
@@ -28,34 +36,34 @@ class GeneratorAgent:
         A more robust function to extract and clean a JSON object from a raw string.
         """
         # Remove markdown code block fences and leading/trailing whitespace
-        text = re.sub(r"```json\n?|\n```", "", text.strip())
+        text = JSON_FENCE_RE.sub("", text.strip())
         
         # Find the JSON block using the first '{' and the last '}'
-        json_match = re.search(r'\{.*\}', text, re.DOTALL)
+        json_match = JSON_OBJECT_RE.search(text)
         if not json_match:
-            print(f"⚠️ Failed to find JSON object in text:\n{text}")
+            logger.warning("Failed to find JSON object in text:\n%s", text)
             raise ValueError("No valid JSON object found in LLM response.")
             
         json_str = json_match.group(0)
 
         # **FIX 1: Remove invalid backslash escapes that are not part of a valid sequence**
         # This looks for a backslash that is NOT followed by ", \, /, b, f, n, r, t, or u.
-        json_str = re.sub(r'\\(?!["\\/bfnrtu])', '', json_str)
+        json_str = INVALID_ESCAPE_RE.sub('', json_str)
         
         # Replace all newline characters with a space to ensure single-line validity for parsing.
         json_str = json_str.replace('\n', ' ')
         
         # **FIX 2: Remove trailing commas before closing braces or brackets**
-        json_str = re.sub(r',\s*([\}\]])', r'\1', json_str)
+        json_str = TRAILING_COMMA_RE.sub(r'\1', json_str)
 
         try:
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            print(f"⚠️ JSON parsing failed. Error: {e}")
-            print(f"Raw string after cleaning was:\n{json_str}")
+            return orjson.loads(json_str)
+        except orjson.JSONDecodeError as e:
+            logger.warning("JSON parsing failed. Error: %s", e)
+            logger.debug("Raw string after cleaning was:\n%s", json_str)
             raise
 
-    def generate_answer(self, raw_query: str, retrieved_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def generate_answer(self, raw_query: str, retrieved_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Generates a structured JSON response based on the query and retrieved context.
         """
@@ -154,13 +162,13 @@ class GeneratorAgent:
         """
 
         try:
-            response = self._model.generate_content(
+            response = await self._model.generate_content_async(
                 prompt,
                 generation_config={"temperature": 0.1, "max_output_tokens": 2048}
             )
             return self._extract_json(response.text)
         except Exception as e:
-            print(f"Error during answer generation for query '{raw_query}': {e}")
+            logger.error("Error during answer generation for query '%s': %s", raw_query, e)
             # This is your error from the log
             if "JSON parsing failed" in str(e):
                  # We already printed the raw string in _extract_json
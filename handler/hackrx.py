@@ -1,18 +1,24 @@
-from fastapi import APIRouter, Header, status, HTTPException
-from typing import List, Optional, Dict, Any
+from fastapi import APIRouter, Header, Request, status, HTTPException
+from typing import List, Optional, Dict, Any, Tuple
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from handler.run import process_questions_parallel
-import requests
+from handler.discord import enqueue_discord_message
+from diskcache import Cache
+from blake3 import blake3
 import os
-import threading
 import tempfile
-import json
+import asyncio
+import hashlib
+import functools
+import time
 import httpx
+import logging
 
 load_dotenv()
 
-file_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
 
 router = APIRouter(
     prefix=f"{os.getenv('ROOT_ENDPOINT')}",
@@ -20,6 +26,25 @@ router = APIRouter(
 )
 
 DISCORD_WEBHOOK_URL2 = os.getenv("DISCORD_WEBHOOK_URL2") or ""
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+URL_FINGERPRINT_CACHE_SIZE = 10000
+URL_HASH_TTL = float(os.getenv("URL_HASH_TTL", "3600"))  # seconds a URL's hash is trusted without revalidation
+
+EXTENSION_MAP = {
+    'application/pdf': '.pdf',
+    'application/msword': '.doc',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
+    'message/rfc822': '.eml',
+    'application/vnd.ms-outlook': '.msg',
+    'text/plain': '.txt'
+}
+
+ZIP_PART_EXTENSIONS = (
+    (b'word/', '.docx'),
+    (b'xl/', '.xlsx'),
+    (b'ppt/', '.pptx'),
+)
 
 
 class Upload(BaseModel):
@@ -27,137 +52,267 @@ class Upload(BaseModel):
     questions: List[str]
 
 
-async def send_to_discord(webhook_url: str, content: str):
+def send_hackrx_result_to_discord(queue: asyncio.Queue, questions: List[str], answers: List[str], document_url: str):
     """
-    Sends a simple message to Discord webhook.
-    
-    Args:
-        webhook_url (str): Discord webhook URL
-        content (str): Message content (up to 2000 characters)
-    """
-    if not webhook_url:
-        print("[WARNING] Discord webhook URL not configured")
-        return
-    
-    try:
-        # Ensure content doesn't exceed Discord's 2000 character limit
-        if len(content) > 2000:
-            content = content[:1997] + "..."
-        
-        payload = {"content": content}
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                webhook_url,
-                json=payload,
-                timeout=10.0
-            )
-            response.raise_for_status()
-            print("[DEBUG] Successfully sent message to Discord")
-            
-    except Exception as e:
-        print(f"[ERROR] Failed to send Discord webhook: {e}")
-
-
-async def send_hackrx_result_to_discord(questions: List[str], answers: List[str], document_url: str):
-    """
-    Sends HackRX processing results to Discord with minimal formatting.
+    Queues HackRX processing results for Discord with minimal formatting.
     
     Args:
+        queue (asyncio.Queue): Discord queue from app state
         questions (List[str]): List of questions processed
         answers (List[str]): List of corresponding answers
         document_url (str): URL of the processed document
     """
+    if not DISCORD_WEBHOOK_URL2:
+        logger.debug("DISCORD_WEBHOOK_URL2 is not set. Skipping Discord result notification.")
+        return
     try:
-        # Start with document URL
-        content = f"\nAnswers:\n"
+        parts = ["\nAnswers:\n"]
+        length = len(parts[0])
         
         # Add answers with numbering
         for i, answer in enumerate(answers, 1):
             answer_text = f"{i}. {answer}\n"
             
             # Check if adding this answer would exceed the limit
-            if len(content + answer_text) > 1950:  # Leave some buffer
-                content += f"... and {len(answers) - i + 1} more answers (truncated due to length)"
+            if length + len(answer_text) > 1950:  # Leave some buffer
+                parts.append(f"... and {len(answers) - i + 1} more answers (truncated due to length)")
                 break
             
-            content += answer_text
+            parts.append(answer_text)
+            length += len(answer_text)
         
-        await send_to_discord(DISCORD_WEBHOOK_URL2, content)
+        enqueue_discord_message(queue, DISCORD_WEBHOOK_URL2, "".join(parts))
         
     except Exception as e:
-        print(f"[ERROR] Failed to send HackRX results to Discord: {e}")
+        logger.error("Failed to send HackRX results to Discord: %s", e)
+
+
+def sniff_extension(head: bytes) -> Optional[str]:
+    """
+    Detects the document type from its leading bytes, or returns None when
+    the signature is unknown or ambiguous.
+    """
+    if head.startswith(b'%PDF'):
+        return '.pdf'
+    if head.startswith(b'{\\rtf'):
+        return '.rtf'
+    if head.startswith(b'PK\x03\x04'):
+        # OOXML containers are zip files; the part names tell them apart
+        for marker, extension in ZIP_PART_EXTENSIONS:
+            if marker in head:
+                return extension
+    return None
+
+
+def get_file_extension(response: httpx.Response, head: bytes = b"") -> str:
+    # Origins often send application/octet-stream, so trust the magic number first
+    sniffed = sniff_extension(head)
+    if sniffed:
+        return sniffed
+    return extension_for_content_type(response.headers.get('content-type', ''))
+
+
+@functools.lru_cache(maxsize=512)
+def extension_for_content_type(content_type: str) -> str:
+    """
+    Maps a raw Content-Type header to a file extension. Deployments see only
+    a handful of distinct headers, so results are memoized.
+    """
+    return EXTENSION_MAP.get(content_type.lower().split(';')[0].strip(), '.pdf')
+
 
+def document_fingerprint(headers: httpx.Headers) -> Optional[Tuple[str, str, str]]:
+    """
+    Identifies a remote document version from its validators. Returns None
+    when the origin sends neither ETag nor Last-Modified, since Content-Length
+    alone cannot tell two versions apart.
+    """
+    etag = headers.get("etag", "")
+    last_modified = headers.get("last-modified", "")
+    if not etag and not last_modified:
+        return None
+    return etag, last_modified, headers.get("content-length", "")
+
+
+# url -> (validators or None, file hash, time.monotonic() when stored)
+FingerprintCache = Dict[str, Tuple[Optional[Tuple[str, str, str]], str, float]]
 
-def get_file_extension(response: requests.Response) -> str:
-    content_type = response.headers.get('content-type', '').lower().split(';')[0]
-    extension_map = {
-        'application/pdf': '.pdf',
-        'application/msword': '.doc',
-        'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
-        'message/rfc822': '.eml',
-        'application/vnd.ms-outlook': '.msg',
-        'text/plain': '.txt'
-    }
-    return extension_map.get(content_type, '.pdf')
+
+async def lookup_document_hash(client: httpx.AsyncClient, url: str, fingerprint_cache: FingerprintCache) -> Optional[str]:
+    """
+    Returns the hash of a previously downloaded document so the download can
+    be skipped. URLs seen within URL_HASH_TTL are trusted outright; older
+    entries are revalidated with a HEAD request when validators are known.
+    """
+    cached = fingerprint_cache.get(url)
+    if cached is None:
+        return None
+    fingerprint, file_hash, stored_at = cached
+    if time.monotonic() - stored_at < URL_HASH_TTL:
+        return file_hash
+    if fingerprint is None:
+        return None
+    etag = fingerprint[0]
+    try:
+        response = await client.head(url, headers={"If-None-Match": etag} if etag else None)
+    except httpx.HTTPError as e:
+        logger.warning("HEAD request failed, falling back to download: %s", e)
+        return None
+    if response.status_code == status.HTTP_304_NOT_MODIFIED or (
+        response.is_success and document_fingerprint(response.headers) == fingerprint
+    ):
+        fingerprint_cache[url] = (fingerprint, file_hash, time.monotonic())
+        return file_hash
+    return None
 
 
-def download_file(url: str) -> str:
+async def download_file(client: httpx.AsyncClient, url: str, fingerprint_cache: FingerprintCache) -> Tuple[str, str]:
     """
-    Downloads a file from the given URL and returns the local file path.
+    Streams a file from the given URL to disk without blocking the event loop
+    and returns the local file path together with its content hash.
+    The document's validators are remembered for lookup_document_hash.
     """
-    print(f"[DEBUG] Downloading file from URL: {url}")
-    with requests.get(url, stream=True) as response:
+    logger.debug("Downloading file from URL: %s", url)
+    async with client.stream("GET", url) as response:
         response.raise_for_status()
-        extension = get_file_extension(response)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=extension) as temp_f:
-            for chunk in response.iter_content(chunk_size=8192):
-                temp_f.write(chunk)
-            print(f"[DEBUG] File downloaded at {temp_f.name}")
-            return temp_f.name  # Return path to the downloaded file
+        fingerprint = document_fingerprint(response.headers)
+        chunks = response.aiter_bytes(DOWNLOAD_CHUNK_SIZE)
+        head = await anext(chunks, b"")
+        extension = get_file_extension(response, head)
+        fd, temp_path = tempfile.mkstemp(suffix=extension)
+        # Hash each chunk in a worker thread while the next one is received;
+        # blake3 releases the GIL, so hashing overlaps the network read
+        loop = asyncio.get_running_loop()
+        hasher = blake3(max_threads=blake3.AUTO)
+        try:
+            hashing = loop.run_in_executor(None, hasher.update, head)
+            write_all(fd, head)
+            async for chunk in chunks:
+                await hashing  # keep updates in order
+                hashing = loop.run_in_executor(None, hasher.update, chunk)
+                write_all(fd, chunk)
+            await hashing
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        finally:
+            os.close(fd)
+    logger.debug("File downloaded at %s", temp_path)
+    # Prefixed so BLAKE3 keys never mix with hashes from other algorithms
+    file_hash = f"b3:{hasher.hexdigest()}"
+    if url not in fingerprint_cache and len(fingerprint_cache) >= URL_FINGERPRINT_CACHE_SIZE:
+        # Evict the oldest entry; dicts keep insertion order
+        fingerprint_cache.pop(next(iter(fingerprint_cache)))
+    fingerprint_cache[url] = (fingerprint, file_hash, time.monotonic())
+    return temp_path, file_hash  # Return path to the downloaded file and its hash
 
 
-def get_answers_from_file(file_path: str, questions: List[str]) -> List[str]:
-    results = process_questions_parallel(questions)
+def write_all(fd: int, data: bytes):
+    """
+    Writes bytes straight to a file descriptor, bypassing Python's buffered IO.
+    """
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def answer_cache_key(file_hash: str, question: str) -> str:
+    question_hash = hashlib.blake2b(question.encode(), digest_size=16).hexdigest()
+    return f"{file_hash}:{question_hash}"
+
+
+def is_cacheable(result: Dict[str, Any]) -> bool:
+    """
+    Only cache real answers; errors and empty retrievals may be transient.
+    """
+    if result.get("status") != "success":
+        return False
+    answer = result.get("answer")
+    return isinstance(answer, dict) and answer.get("decision") not in ("Error", "Not Found")
+
+
+def get_cached_answers(answer_cache: Cache, keys: List[str]) -> List[Optional[str]]:
+    """
+    Looks up every key in one pass. diskcache reads hit SQLite, so call this
+    from a worker thread rather than the event loop.
+    """
+    return [answer_cache.get(key) for key in keys]
+
+
+def set_cached_answers(answer_cache: Cache, items: List[Tuple[str, str]]):
+    """
+    Stores a batch of answers in a single transaction, so the batch costs one
+    SQLite commit. Call this from a worker thread.
+    """
+    with answer_cache.transact():
+        for key, answer in items:
+            answer_cache.set(key, answer, expire=ANSWER_CACHE_TTL)
+
+
+async def get_answers_from_file(file_hash: str, questions: List[str], answer_cache: Cache) -> List[str]:
+    keys = [answer_cache_key(file_hash, question) for question in questions]
+    answers = await asyncio.to_thread(get_cached_answers, answer_cache, keys)
+    missing = [i for i, answer in enumerate(answers) if answer is None]
+    logger.debug("Answer cache hits: %d/%d", len(questions) - len(missing), len(questions))
+    if not missing:
+        return answers
+
+    results = await process_questions_parallel([questions[i] for i in missing])
     
     # Extract only the generated_answer from each result
-    answers = []
-    for result in results:
+    to_cache = []
+    for i, result in zip(missing, results):
         if result.get("status") == "success":
-            answers.append(result.get("generated_answer", ""))
+            answers[i] = result.get("generated_answer", "")
+            if is_cacheable(result):
+                to_cache.append((keys[i], answers[i]))
         else:
             # For errors, include the error message as the answer
-            answers.append(f"Error: {result.get('error', 'Unknown error')}")
+            answers[i] = f"Error: {result.get('error', 'Unknown error')}"
+    if to_cache:
+        await asyncio.to_thread(set_cached_answers, answer_cache, to_cache)
     return answers
 
 
 @router.post("/hackrx/run", status_code=status.HTTP_200_OK)
-async def run_hackrx(req: Upload, Authorization: Optional[str] = Header(None)):
-    print(f"[DEBUG] Received /hackrx/run request: documents={req.documents}, questions={req.questions}")
-    temp_file = None
-    try:
-        temp_file = download_file(req.documents)
-        answers = get_answers_from_file(temp_file, req.questions)
-        print(f"[DEBUG] Answer extraction completed.")
+async def run_hackrx(req: Upload, request: Request, Authorization: Optional[str] = Header(None)):
+    logger.debug("Received /hackrx/run request: documents=%s, questions=%s", req.documents, req.questions)
+    # Bound in-flight jobs so bursts queue here instead of exhausting temp disk and LLM quota
+    async with request.app.state.job_semaphore:
+        temp_file = None
+        try:
+            client = request.app.state.http_client
+            fingerprint_cache = request.app.state.url_fingerprint_cache
+            file_hash = await lookup_document_hash(client, req.documents, fingerprint_cache)
+            if file_hash is None:
+                temp_file, file_hash = await download_file(client, req.documents, fingerprint_cache)
+            else:
+                logger.debug("Document unchanged since last download, skipping fetch")
+            answers = await get_answers_from_file(file_hash, req.questions, request.app.state.answer_cache)
+            logger.debug("Answer extraction completed.")
         
-        # Send results to Discord
-        await send_hackrx_result_to_discord(req.questions, answers, req.documents)
+            # Send results to Discord in the background
+            send_hackrx_result_to_discord(request.app.state.discord_queue, req.questions, answers, req.documents)
         
-        return {"answers": answers}
-    except requests.RequestException as e:
-        print(f"[ERROR] File download failed: {e}")
-        # Send error to Discord
-        await send_to_discord(DISCORD_WEBHOOK_URL2, f"HackRX Error - File download failed: {e}\nDocument: {req.documents}")
-        raise HTTPException(status_code=400, detail=f"Download failed: {e}")
-    except Exception as e:
-        print(f"[ERROR] Internal error: {e}")
-        # Send error to Discord
-        await send_to_discord(DISCORD_WEBHOOK_URL2, f"HackRX Error - Internal error: {e}\nDocument: {req.documents}")
-        raise HTTPException(status_code=500, detail=f"Internal error: {e}")
-    finally:
-        if temp_file and os.path.exists(temp_file):
-            try:
-                os.remove(temp_file)
-                print(f"[DEBUG] Cleaned up temp file: {temp_file}")
-            except Exception as e:
-                print(f"[WARNING] Failed to remove temp file: {e}")
\ No newline at end of file
+            return {"answers": answers}
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            logger.error("File download failed: %s", e)
+            # Send error to Discord
+            if DISCORD_WEBHOOK_URL2:
+                enqueue_discord_message(request.app.state.discord_queue, DISCORD_WEBHOOK_URL2, f"HackRX Error - File download failed: {e}\nDocument: {req.documents}")
+            raise HTTPException(status_code=400, detail=f"Download failed: {e}")
+        except Exception as e:
+            logger.error("Internal error: %s", e)
+            # Send error to Discord
+            if DISCORD_WEBHOOK_URL2:
+                enqueue_discord_message(request.app.state.discord_queue, DISCORD_WEBHOOK_URL2, f"HackRX Error - Internal error: {e}\nDocument: {req.documents}")
+            raise HTTPException(status_code=500, detail=f"Internal error: {e}")
+        finally:
+            if temp_file:
+                try:
+                    os.unlink(temp_file)
+                    logger.debug("Cleaned up temp file: %s", temp_file)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning("Failed to remove temp file: %s", e)
\ No newline at end of file
@@ -1,11 +1,18 @@
 import os
-import json
+import orjson
+import asyncio
 import re
+import logging
 from typing import List, Optional
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 import google.generativeai as genai
 
+logger = logging.getLogger(__name__)
+
+JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+TRAILING_COMMA_RE = re.compile(r',\s*([\}\]])')
+
 # Pydantic model for structured, validated output
 class EnhancedQuery(BaseModel):
     intent: str = Field(description="The primary user intent (e.g., 'coverage_check', 'waiting_period', 'definition').")
@@ -37,18 +44,18 @@ class QueryEnhancerAgent:
         Extracts and cleans a JSON object from a string, handling common LLM formatting issues.
         """
         # Find the JSON block using the first '{' and the last '}'
-        json_match = re.search(r'\{.*\}', text, re.DOTALL)
+        json_match = JSON_OBJECT_RE.search(text)
         if not json_match:
             raise ValueError("No JSON object found in the response string.")
         
         json_str = json_match.group(0)
         
         # Remove trailing commas that cause parsing errors
-        json_str = re.sub(r',\s*([\}\]])', r'\1', json_str)
+        json_str = TRAILING_COMMA_RE.sub(r'\1', json_str)
         
-        return json.loads(json_str)
+        return orjson.loads(json_str)
 
-    def enhance_query(self, query: str) -> EnhancedQuery:
+    async def enhance_query(self, query: str) -> EnhancedQuery:
         """
         Takes a raw user query and returns a structured Pydantic model.
         """
@@ -86,7 +93,7 @@ class QueryEnhancerAgent:
         JSON:
         """
         try:
-            response = self._model.generate_content(
+            response = await self._model.generate_content_async(
                 prompt,
                 generation_config={"temperature": 0.1, "max_output_tokens": 512}
             )
@@ -94,7 +101,7 @@ class QueryEnhancerAgent:
             return EnhancedQuery(**response_data)
 
         except Exception as e:
-            print(f"Error enhancing query '{query}': {e}. Falling back to basic structure.")
+            logger.warning("Error enhancing query '%s': %s. Falling back to basic structure.", query, e)
             return EnhancedQuery(
                 intent="general_query",
                 entities=[query],
@@ -104,5 +111,5 @@ class QueryEnhancerAgent:
 if __name__ == '__main__':
     agent = QueryEnhancerAgent()
     test_query = "Are the medical expenses for an organ donor covered under this policy?"
-    enhanced = agent.enhance_query(test_query)
+    enhanced = asyncio.run(agent.enhance_query(test_query))
     print(enhanced.model_dump_json(indent=2))
\ No newline at end of file
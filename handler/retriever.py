@@ -87,12 +87,17 @@
 #         return reranked_results[:top_k_final]
 
 import os
+import logging
 from typing import List, Dict, Any
 from dotenv import load_dotenv
 from FlagEmbedding import BGEM3FlagModel
 from pinecone.grpc import PineconeGRPC as Pinecone
 from handler.query_enhancer import EnhancedQuery
 
+logger = logging.getLogger(__name__)
+
+PINECONE_QUERY_TIMEOUT = 10.0  # seconds per Pinecone query
+
 def hybrid_score_norm(dense, sparse, alpha: float):
     if alpha < 0 or alpha > 1:
         raise ValueError("Alpha must be between 0 and 1")
@@ -129,25 +134,52 @@ class RetrieverAgent:
         return " ".join(filter(None, parts))
 
     def retrieve_and_rerank(self, enhanced_query: EnhancedQuery, top_k_initial: int = 35, top_k_final: int = 5, alpha: float = 0.5) -> List[Dict[str, Any]]:
-        search_query = self._compose_search_query(enhanced_query)
-        result = RetrieverAgent._embedder.encode([search_query], return_dense=True, return_sparse=True)
-        dense_emb = result['dense_vecs'][0]
-        lw = result['lexical_weights'][0]
+        return self.retrieve_and_rerank_batch([enhanced_query], top_k_final=top_k_final, alpha=alpha)[0]
+
+    def retrieve_and_rerank_batch(self, enhanced_queries: List[EnhancedQuery], top_k_final: int = 5, alpha: float = 0.5, timeout: float = PINECONE_QUERY_TIMEOUT) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieves chunks for several queries at once: a single embedding pass
+        over all search queries, then every Pinecone query issued before any
+        result is awaited. Returns one result list per query, in order; a query
+        that fails or exceeds timeout seconds yields an empty list.
+        """
+        if not enhanced_queries:
+            return []
+        search_queries = [self._compose_search_query(q) for q in enhanced_queries]
+        result = RetrieverAgent._embedder.encode(search_queries, return_dense=True, return_sparse=True)
+        futures = []
+        for dense_emb, lw in zip(result['dense_vecs'], result['lexical_weights']):
+            # Apply alpha weighting if desired
+            hdense, hsparse = hybrid_score_norm(dense_emb, self._to_sparse(lw), alpha)
+            try:
+                futures.append(RetrieverAgent._index.query(
+                    vector=hdense,
+                    sparse_vector=hsparse,
+                    top_k=top_k_final,
+                    namespace=RetrieverAgent._namespace,
+                    include_metadata=True,
+                    async_req=True,
+                    timeout=timeout
+                ))
+            except Exception as e:
+                logger.error("Error querying Pinecone: %s", e)
+                futures.append(None)
+        return [self._collect_matches(future, timeout) for future in futures]
+
+    @staticmethod
+    def _to_sparse(lw) -> Dict[str, list]:
         indices = [int(idx) for idx, val in lw.items() if float(val) != 0.0]
         values = [float(val) for idx, val in lw.items() if float(val) != 0.0]
-        sparse = {'indices': indices, 'values': values}
-        # Apply alpha weighting if desired
-        hdense, hsparse = hybrid_score_norm(dense_emb, sparse, alpha)
+        return {'indices': indices, 'values': values}
+
+    @staticmethod
+    def _collect_matches(future, timeout: float) -> List[Dict[str, Any]]:
+        if future is None:
+            return []
         try:
-            results = RetrieverAgent._index.query(
-                vector=hdense,
-                sparse_vector=hsparse,
-                top_k=top_k_final,
-                namespace=RetrieverAgent._namespace,
-                include_metadata=True
-            )["matches"]
+            results = future.result(timeout=timeout)["matches"]
         except Exception as e:
-            print(f"Error querying Pinecone: {e}")
+            logger.error("Error querying Pinecone: %s", e)
             return []
         if not results:
             return []
@@ -1,16 +1,36 @@
-from handler.query_enhancer import QueryEnhancerAgent
+from handler.query_enhancer import QueryEnhancerAgent, EnhancedQuery
 from handler.retriever import RetrieverAgent
 from handler.generator import GeneratorAgent
 from typing import Dict, Any, List
-import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
-import time
+import asyncio
+import functools
+import logging
 
-enhancer = QueryEnhancerAgent()
-retriever = RetrieverAgent()
-generator = GeneratorAgent()
-CHANNEL_NAME = "hakrx_events"
+logger = logging.getLogger(__name__)
+
+# Seconds per LLM call for each question. Batched retrieval is not covered
+# per question; it gets one limit of the same length for all questions together.
+QUESTION_TIMEOUT = 30
+
+
+# Agents are built on first use so importing this module does not load models
+@functools.lru_cache(maxsize=1)
+def get_enhancer() -> QueryEnhancerAgent:
+    return QueryEnhancerAgent()
+
+@functools.lru_cache(maxsize=1)
+def get_retriever() -> RetrieverAgent:
+    return RetrieverAgent()
+
+@functools.lru_cache(maxsize=1)
+def get_generator() -> GeneratorAgent:
+    return GeneratorAgent()
+
+def load_agents():
+    """Build every agent up front, e.g. at server startup, so no request pays the model load"""
+    get_enhancer()
+    get_retriever()
+    get_generator()
 
 
 def extract_decision_from_answer(answer: Dict[str, Any]) -> str:
@@ -24,70 +44,69 @@ def extract_decision_from_answer(answer: Dict[str, Any]) -> str:
         return str(answer)
     return str(answer)
 
-def process_single_question(user_query):
-    """Process a single question through the pipeline"""
-    # Re-import agents inside the process to avoid multiprocessing issues
-    from handler.query_enhancer import QueryEnhancerAgent
-    from handler.retriever import RetrieverAgent
-    from handler.generator import GeneratorAgent
-    print(f"Processing question: {user_query}")
-    enhancer = QueryEnhancerAgent()
-    retriever = RetrieverAgent()
-    generator = GeneratorAgent()
+async def process_questions_parallel(questions: List[str], max_concurrency: int = 10) -> List[Dict[str, Any]]:
+    """
+    Process multiple questions stage by stage: LLM calls run concurrently with
+    at most max_concurrency in flight, while retrieval embeds every question in
+    one batch. Results are returned in the order of the questions.
+    """
+    if not questions:
+        return []
+    
+    enhancer = get_enhancer()
+    retriever = get_retriever()
+    generator = get_generator()
+    semaphore = asyncio.Semaphore(max_concurrency)
 
-    try:
-        enhanced = enhancer.enhance_query(user_query)
-        chunks = retriever.retrieve_and_rerank(enhanced)
-        answer = generator.generate_answer(user_query, chunks)
-        generated_answer = extract_decision_from_answer(answer)
+    async def bounded(coro):
+        async with semaphore:
+            return await asyncio.wait_for(coro, timeout=QUESTION_TIMEOUT)
 
+    def error_result(question: str, error: Exception) -> Dict[str, Any]:
+        if isinstance(error, asyncio.TimeoutError):
+            error = f"timed out after {QUESTION_TIMEOUT}s"
         return {
-            "question": user_query,
-            "enhanced": enhanced.model_dump() if hasattr(enhanced, 'model_dump') else str(enhanced),
-            "chunks": chunks,
-            "answer": answer,
-            "generated_answer": generated_answer,
-            "status": "success"
-        }
-    except Exception as e:
-        return {
-            "question": user_query,
-            "error": str(e),
+            "question": question,
+            "error": f"Processing failed: {error}",
             "status": "error"
         }
 
-def process_questions_parallel(questions: List[str], max_workers: int = 10) -> List[Dict[str, Any]]:
-    """Process multiple questions in parallel using ThreadPoolExecutor"""
-    if not questions:
-        return []
-    
+    logger.debug("Processing %d questions", len(questions))
+    enhanced = await asyncio.gather(
+        *(bounded(enhancer.enhance_query(question)) for question in questions),
+        return_exceptions=True
+    )
+    # Same fallback the enhancer uses when its own LLM call fails
+    enhanced = [
+        e if isinstance(e, EnhancedQuery) else EnhancedQuery(intent="general_query", entities=[q], raw_query=q)
+        for q, e in zip(questions, enhanced)
+    ]
+
+    # Embedding and the Pinecone queries are blocking, so run them in a worker thread
+    try:
+        chunks = await asyncio.wait_for(
+            asyncio.to_thread(retriever.retrieve_and_rerank_batch, enhanced),
+            timeout=QUESTION_TIMEOUT
+        )
+    except Exception as e:
+        return [error_result(question, e) for question in questions]
+
+    answers = await asyncio.gather(
+        *(bounded(generator.generate_answer(q, c)) for q, c in zip(questions, chunks)),
+        return_exceptions=True
+    )
+
     results = []
-    
-    # Use ThreadPoolExecutor for parallel processing
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all questions for processing
-        future_to_question = {
-            executor.submit(process_single_question, question): question 
-            for question in questions
-        }
-        
-        # Collect results as they complete
-        for future in as_completed(future_to_question):
-            question = future_to_question[future]
-            try:
-                result = future.result(timeout=30)  # 30 second timeout per question
-                results.append(result)
-            except Exception as e:
-                # Handle any exceptions that occurred during processing
-                error_result = {
-                    "question": question,
-                    "error": f"Processing failed: {str(e)}",
-                    "status": "error"
-                }
-                results.append(error_result)
-    
-    # Sort results to maintain original question order
-    question_to_index = {q: i for i, q in enumerate(questions)}
-    results.sort(key=lambda x: question_to_index.get(x.get("question", ""), len(questions)))
-    
-    return results
\ No newline at end of file
+    for question, enhanced_query, question_chunks, answer in zip(questions, enhanced, chunks, answers):
+        if isinstance(answer, Exception):
+            results.append(error_result(question, answer))
+            continue
+        results.append({
+            "question": question,
+            "enhanced": enhanced_query.model_dump(),
+            "chunks": question_chunks,
+            "answer": answer,
+            "generated_answer": extract_decision_from_answer(answer),
+            "status": "success"
+        })
+    return results
@@ -1,16 +1,67 @@
-from typing import Union
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
-from pydantic import BaseModel
 from handler.hackrx import router
+from handler.discord import discord_consumer
+from handler.run import load_agents
 from middleware.middleware import authentication_middleware
 from middleware.logMiddleware import discord_webhook_middleware
 from starlette.middleware.base import BaseHTTPMiddleware
+from diskcache import Cache
+import httpx
+import os
+import logging
+import asyncio
 
-app = FastAPI()
+# Defaults to WARNING so debug logging on the request path costs nothing in production
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+logger = logging.getLogger(__name__)
+
+DISCORD_DRAIN_TIMEOUT = 5.0  # seconds to flush queued Discord messages on shutdown
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("Running on event loop %s", type(asyncio.get_running_loop()).__name__)
+    # Load the embedding model and LLM clients before serving, off the event loop
+    await asyncio.to_thread(load_agents)
+    # One pooled client for document downloads, shared across requests
+    app.state.http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(60.0),
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        follow_redirects=True
+    )
+    # url -> (ETag/Last-Modified/Content-Length, file hash, stored at) of the last download
+    app.state.url_fingerprint_cache = {}
+    # Separate long-lived client so webhook posts reuse a warm connection
+    app.state.discord_client = httpx.AsyncClient(
+        base_url="https://discord.com",
+        timeout=10.0,
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=5)
+    )
+    # Bounded queue drained by a single consumer keeps webhooks off the request path
+    app.state.discord_queue = asyncio.Queue(maxsize=1000)
+    consumer = asyncio.create_task(discord_consumer(app.state.discord_client, app.state.discord_queue))
+    app.state.job_semaphore = asyncio.Semaphore(int(os.getenv("MAX_CONCURRENT_JOBS", "8")))
+    # Answers keyed by document hash + question hash survive restarts
+    app.state.answer_cache = Cache(os.getenv("ANSWER_CACHE_DIR", "answer_cache"))
+    yield
+    # Give queued Discord messages a chance to go out before the client closes
+    try:
+        await asyncio.wait_for(app.state.discord_queue.join(), DISCORD_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Discord queue not drained before shutdown, dropping %d messages", app.state.discord_queue.qsize())
+    consumer.cancel()
+    with suppress(asyncio.CancelledError):
+        await consumer
+    await app.state.discord_client.aclose()
+    await app.state.http_client.aclose()
+    app.state.answer_cache.close()
+
+app = FastAPI(lifespan=lifespan)
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the HackRX API"}
-tags=["hackrx"]
 app.include_router(router)
 app.add_middleware(BaseHTTPMiddleware, dispatch=discord_webhook_middleware)
 app.add_middleware(BaseHTTPMiddleware, dispatch=authentication_middleware)
\ No newline at end of file
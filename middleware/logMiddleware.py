@@ -1,17 +1,17 @@
 import os
-import json
-import httpx
-from fastapi import FastAPI, Request
+import logging
+import orjson
+from fastapi import Request
 from fastapi.responses import Response
 from dotenv import load_dotenv
+from handler.discord import enqueue_discord_message
 
 load_dotenv()
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
 
-@app.middleware("http")
 async def discord_webhook_middleware(request: Request, call_next):
     # Read body (bytes)
     body_bytes = await request.body()
@@ -19,8 +19,8 @@ async def discord_webhook_middleware(request: Request, call_next):
 
     # Try to parse body as JSON for pretty formatting
     try:
-        body_json = json.loads(body_text) if body_text else None
-        pretty_body = json.dumps(body_json, indent=2) if body_json else body_text
+        body_json = orjson.loads(body_bytes) if body_bytes else None
+        pretty_body = orjson.dumps(body_json, option=orjson.OPT_INDENT_2).decode() if body_json else body_text
     except Exception:
         pretty_body = body_text  # fallback to raw text
 
@@ -46,21 +46,11 @@ async def discord_webhook_middleware(request: Request, call_next):
     if len(content) > 2000:
         content = content[:1997] + "..."
 
-    # Send message to Discord webhook with httpx async client
+    # Queue the message for the background Discord consumer so the request is never blocked on it
     if DISCORD_WEBHOOK_URL:
-        async with httpx.AsyncClient() as client:
-            try:
-                webhook_response = await client.post(
-                    DISCORD_WEBHOOK_URL,
-                    json={"content": content},
-                    timeout=10.0  # Add timeout to prevent hanging
-                )
-                webhook_response.raise_for_status()  # Raise exception for HTTP errors
-            except Exception as e:
-                # Log or print but do not block request processing on failure
-                print(f"Failed to send Discord webhook: {e}")
+        enqueue_discord_message(request.app.state.discord_queue, DISCORD_WEBHOOK_URL, content)
     else:
-        print("DISCORD_WEBHOOK_URL is not set. Skipping Discord webhook notification.")
+        logger.debug("DISCORD_WEBHOOK_URL is not set. Skipping Discord webhook notification.")
 
     # Re-create the request with the body for downstream processing
     # This is the proper way to handle body consumption in FastAPI middleware
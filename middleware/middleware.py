@@ -1,12 +1,11 @@
 import os
-from fastapi import FastAPI, Request, status
+from fastapi import Request, status
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 
 load_dotenv()
-app = FastAPI()
 
-@app.middleware("http")
+
 async def authentication_middleware(request: Request, call_next):
     authorization = request.headers.get("authorization")
     if authorization is None: